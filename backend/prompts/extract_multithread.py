@@ -1,18 +1,85 @@
 # Import necessary modules
 import ell
-from pydantic import BaseModel, Field, ValidationError
-from typing import List, Dict
+import httpx
+import tiktoken
+from aiolimiter import AsyncLimiter
+from openai import AsyncOpenAI, OpenAI, OpenAIError
+from pydantic import (
+    BaseModel,
+    ConfigDict,
+    Field,
+    PrivateAttr,
+    ValidationError,
+    field_validator,
+)
+from typing import List, Dict, Set, Tuple
+import argparse
+import asyncio
 import json
+import os
 import re
 import concurrent.futures
 import logging
+import time
+from collections import defaultdict
+from itertools import chain
+
+try:
+    from prompts.llm_cache import ExtractionCache
+except ImportError:  # Running as a script from within prompts/
+    from llm_cache import ExtractionCache
 
 # Configure logging
 logging.basicConfig(filename="requirements_extraction.log", level=logging.INFO)
 
 
+def _init_ell():
+    """Enable ell's store and verbose tracing only when ELL_TRACE is set.
+
+    Persisting every call to the SQLite store and pretty-printing to stdout
+    cost disk I/O and a stdout lock per call — significant under high
+    concurrency — so production runs skip both.
+    """
+    if os.getenv("ELL_TRACE"):
+        ell.init(store="./logdir", autocommit=True, verbose=True)
+
+# Default number of chunk extractions allowed in flight at once
+DEFAULT_CONCURRENCY = 20
+
+# Default requests-per-minute budget; set below the account's RPM limit so
+# calls are paced instead of hitting 429s and stalling in backoff
+DEFAULT_RPM = 500
+
+# Model used for extraction; part of the cache key
+MODEL = "gpt-4o"
+
+# A single pool with HTTP/2 multiplexes all in-flight chunk calls in a run
+# over a few connections instead of paying a TCP+TLS handshake per call. The
+# client is created per run and closed with it: pooled connections are bound
+# to the event loop they were opened on, so one cannot outlive the
+# asyncio.run invocation that used it.
+def _make_async_client() -> AsyncOpenAI:
+    """Build the OpenAI client shared by all chunk calls in one run."""
+    return AsyncOpenAI(
+        http_client=httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=100),
+        )
+    )
+
+
+# Keep instantiation on pydantic-core's fast path: no per-assignment
+# revalidation, unknown keys dropped, and string stripping done in Rust
+# rather than in Python validators
+_MODEL_CONFIG = ConfigDict(
+    validate_assignment=False, extra="ignore", str_strip_whitespace=True
+)
+
+
 # Define Pydantic models for structured output
 class Requirement(BaseModel):
+    model_config = _MODEL_CONFIG
+
     id: str = Field(description="Unique identifier in the format 'R{id}'")
     description: str = Field(description="Brief description of the requirement")
     reference: str = Field(description="Exact quote from the style guide")
@@ -21,34 +88,106 @@ class Requirement(BaseModel):
     where: str = Field(description="Where the requirement should be applied")
     when: str = Field(description="When the requirement should be applied")
 
+    # Normalize at parse time, inside pydantic-core, instead of re-walking
+    # every requirement in a Python post-processing pass; string stripping
+    # happens via str_strip_whitespace in the model config
+    @field_validator("classification")
+    @classmethod
+    def _normalize_classification(cls, v):
+        return v if v in ALLOWED_CLASSIFICATIONS else "Flexible Guideline"
+
 
 class Group(BaseModel):
+    model_config = _MODEL_CONFIG
+
     description: str = Field(description="Description of the group")
     requirements: List[Requirement] = Field(default_factory=list)
 
 
 class RequirementsDocument(BaseModel):
+    model_config = _MODEL_CONFIG
+
     groups: Dict[str, Group] = Field(default_factory=dict)
 
+    # Incremental dedup sets per group, so merges don't rebuild the full
+    # (description, reference) set on every update call
+    _seen: Dict[str, Set[Tuple[str, str]]] = PrivateAttr(default_factory=dict)
+
+    # Per-group locks so concurrent async merges serialize only on the
+    # groups they actually touch
+    _locks: Dict[str, asyncio.Lock] = PrivateAttr(
+        default_factory=lambda: defaultdict(asyncio.Lock)
+    )
+
+    def _seen_for(self, group_name: str) -> Set[Tuple[str, str]]:
+        """Lazily build the dedup set for a group from its requirements."""
+        if group_name not in self._seen:
+            self._seen[group_name] = {
+                (req.description.strip(), req.reference.strip())
+                for req in self.groups[group_name].requirements
+            }
+        return self._seen[group_name]
+
+    def _merge_group(self, group_name: str, group: Group) -> None:
+        """Merge one group's requirements into this document."""
+        if group_name not in self.groups:
+            self.groups[group_name] = group
+            self._seen[group_name] = {
+                (req.description.strip(), req.reference.strip())
+                for req in group.requirements
+            }
+        else:
+            seen = self._seen_for(group_name)
+            for req in group.requirements:
+                fingerprint = (req.description.strip(), req.reference.strip())
+                if fingerprint not in seen:
+                    self.groups[group_name].requirements.append(req)
+                    seen.add(fingerprint)
+
     def update(self, other: "RequirementsDocument") -> "RequirementsDocument":
         """Updates the current document with another, merging groups and requirements."""
         for group_name, group in other.groups.items():
-            if group_name not in self.groups:
-                self.groups[group_name] = group
-            else:
-                existing_requirements = {
-                    (req.description.strip(), req.reference.strip())
-                    for req in self.groups[group_name].requirements
-                }
-                for req in group.requirements:
-                    if (
-                        req.description.strip(),
-                        req.reference.strip(),
-                    ) not in existing_requirements:
-                        self.groups[group_name].requirements.append(req)
+            self._merge_group(group_name, group)
+        return self
+
+    async def update_async(self, other: "RequirementsDocument") -> "RequirementsDocument":
+        """Async update: per-group locks let disjoint groups merge concurrently."""
+        for group_name, group in other.groups.items():
+            async with self._locks[group_name]:
+                self._merge_group(group_name, group)
         return self
 
 
+# Wire format for structured outputs: strict JSON schemas require
+# additionalProperties to be false on every object and cannot express an
+# arbitrary-key map like Dict[str, Group], so groups travel as a list of
+# named entries (all fields required, as strict mode demands) and are
+# folded back into the dict-keyed document
+class NamedGroup(BaseModel):
+    model_config = _MODEL_CONFIG
+
+    name: str = Field(description="Name of the group")
+    description: str = Field(description="Description of the group")
+    requirements: List[Requirement] = Field(description="Requirements in the group")
+
+
+class RequirementsDocumentWire(BaseModel):
+    model_config = _MODEL_CONFIG
+
+    groups: List[NamedGroup] = Field(description="All extracted requirement groups")
+
+    def to_document(self) -> RequirementsDocument:
+        """Fold the named-group list back into the dict-keyed document."""
+        return RequirementsDocument(
+            groups={
+                group.name: Group(
+                    description=group.description, requirements=group.requirements
+                )
+                for group in self.groups
+            }
+        )
+
+
 # Allowed classification terms
 ALLOWED_CLASSIFICATIONS = {
     "Imperative Standard",
@@ -59,6 +198,12 @@ ALLOWED_CLASSIFICATIONS = {
     "Non-Applicable Element",
 }
 
+# System message shared by the sync and async extraction paths
+SYSTEM_PROMPT = "You are an assistant that extracts prescriptive requirements from style guide text and outputs them in a structured JSON format."
+
+# Bump whenever the prompt changes so stale cache entries are ignored
+PROMPT_VERSION = "v2"
+
 # Define the extraction prompt as a separate variable for version control
 EXTRACTION_PROMPT = """
 Your task is to extract all prescriptive requirements from the provided style guide chunk and output them in a structured JSON format.
@@ -80,60 +225,484 @@ Instructions:
 Important: Output only the JSON structure. Do not include any explanations or text outside the JSON.
 """
 
+# Full instruction prefix, sent byte-identical as the system message on every
+# call so provider-side prompt caching engages; only the chunk itself varies
+# in the user message
+STATIC_SYSTEM_PROMPT = SYSTEM_PROMPT + "\n" + EXTRACTION_PROMPT
 
-# Define the ell function to extract requirements
-@ell.simple(model="gpt-4o", temperature=0.0)
-def extract_requirements_from_chunk(chunk: str, i: int, total_chunks: int):
-    """
-    Extract requirements from a chunk of the style guide.
-    You are an assistant that extracts prescriptive requirements from style guide text and outputs them in a structured JSON format.
+
+# Define the ell function to extract requirements (used by the legacy threaded
+# path); takes a message history so validation errors can be fed back on retry
+@ell.complex(model=MODEL, temperature=0.0)
+def extract_requirements_from_chunk(message_history: List[ell.Message]):
+    """Extract requirements from a chunk of the style guide."""
+    return [ell.system(STATIC_SYSTEM_PROMPT)] + message_history
+
+
+# Async variant calling the OpenAI client directly; extraction is pure network
+# I/O, so coroutines scale far beyond the thread pool's default worker cap
+async def extract_requirements_from_chunk_async(
+    client: AsyncOpenAI, chunk: str, i: int, total_chunks: int
+) -> RequirementsDocument:
+    """Extract requirements from a chunk of the style guide asynchronously.
+
+    Uses structured outputs so the server guarantees JSON matching the
+    wire schema; no fence stripping or parse retries needed.
     """
-    return [ell.user(EXTRACTION_PROMPT + f"\n\nChunk ({i}/{total_chunks}):\n{chunk}")]
+    response = await client.beta.chat.completions.parse(
+        model=MODEL,
+        temperature=0.0,
+        response_format=RequirementsDocumentWire,
+        messages=[
+            {"role": "system", "content": STATIC_SYSTEM_PROMPT},
+            {"role": "user", "content": f"Chunk ({i}/{total_chunks}):\n{chunk}"},
+        ],
+    )
+    message = response.choices[0].message
+    if message.parsed is None:
+        # Refused or filtered responses carry no parsed payload
+        raise OpenAIError(
+            f"No parsed output for chunk {i}: {message.refusal or 'empty response'}"
+        )
+    return message.parsed.to_document()
+
+
+# Strip Markdown code fences from raw model output (legacy path only; the
+# async path gets schema-validated JSON from the server). Note str.strip with
+# a character class would corrupt outputs starting with 'j', 's', 'o' or 'n'.
+_CODE_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+def strip_code_fences(raw_output: str) -> str:
+    """Remove leading/trailing Markdown code fences from raw model output."""
+    return _CODE_FENCE_RE.sub("", raw_output.strip()).strip()
+
+
+# Section boundary: split before '[' at the start of a line, compiled once
+# at module load instead of on every split_content call
+_SECTION_RE = re.compile(r"(?<=\n)\s*(?=\[)")
 
+# Paragraph boundary, used to sub-split sections too large for one chunk
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
 
-# Function to split the style guide into manageable chunks
-def split_content(style_guide_text: str, max_chunk_size=2000) -> List[str]:
-    """Split the style guide text into chunks not exceeding max_chunk_size, based on logical sections."""
+# Tokenizer for the extraction model, loaded on first use
+_ENCODER = None
+
+
+def _token_len(text: str) -> int:
+    """Token count of text under the extraction model's encoding."""
+    global _ENCODER
+    if _ENCODER is None:
+        _ENCODER = tiktoken.encoding_for_model(MODEL)
+    return len(_ENCODER.encode(text))
+
+
+def _split_paragraphs(section: str, max_chunk_size: int) -> List[Tuple[str, int]]:
+    """Split an oversized section at paragraph boundaries rather than mid-sentence."""
+    pieces = []
+    current = ""
+    current_tokens = 0
+    for para in _PARAGRAPH_RE.split(section):
+        para_tokens = _token_len(para)
+        if current and current_tokens + para_tokens > max_chunk_size:
+            pieces.append((current, current_tokens))
+            current = para + "\n\n"
+            current_tokens = para_tokens
+        else:
+            current += para + "\n\n"
+            current_tokens += para_tokens
+    if current:
+        pieces.append((current, current_tokens))
+    return pieces
+
+
+# Function to split the style guide into manageable chunks; sizes are in
+# tokens of the extraction model, not characters, since token density varies
+# several-fold between prose and markup
+def split_content(
+    style_guide_text: str, max_chunk_size=1500, min_chunk_size=1000
+) -> List[str]:
+    """Split the style guide text into chunks packed close to max_chunk_size tokens, based on logical sections."""
     # Split on titles or hierarchy markers to maintain logical sections
-    sections = re.split(
-        r"(?<=\n)\s*(?=\[)", style_guide_text
-    )  # Split before '[' at the start of a line
+    sections = _SECTION_RE.split(style_guide_text)
+
+    # Sub-split any section that cannot fit in a chunk on its own, so
+    # packing works at paragraph granularity instead of starting a new,
+    # mostly empty chunk whenever a large section arrives. Each piece is
+    # encoded once and carries its token count.
+    pieces = []
+    for section in sections:
+        section_tokens = _token_len(section)
+        if section_tokens > max_chunk_size:
+            pieces.extend(_split_paragraphs(section, max_chunk_size))
+        else:
+            pieces.append((section, section_tokens))
+
     chunks = []
+    chunk_tokens = []
     current_chunk = ""
-    for section in sections:
-        if len(current_chunk) + len(section) <= max_chunk_size:
-            current_chunk += section
+    current_tokens = 0
+    for piece, piece_tokens in pieces:
+        if current_tokens + piece_tokens <= max_chunk_size:
+            current_chunk += piece
+            current_tokens += piece_tokens
         else:
-            chunks.append(current_chunk.strip())
-            current_chunk = section
+            # A single paragraph can exceed the cap and arrive as an
+            # oversized piece; don't flush an empty chunk ahead of it
+            if current_chunk:
+                chunks.append(current_chunk.strip())
+                chunk_tokens.append(current_tokens)
+            current_chunk = piece
+            current_tokens = piece_tokens
     if current_chunk:
         chunks.append(current_chunk.strip())
+        chunk_tokens.append(current_tokens)
+
+    # Fold an under-filled trailing chunk into its predecessor when the
+    # combined size still fits under the cap; fewer chunks means fewer
+    # LLM round-trips
+    if (
+        len(chunks) > 1
+        and chunk_tokens[-1] < min_chunk_size
+        and chunk_tokens[-2] + chunk_tokens[-1] <= max_chunk_size
+    ):
+        chunks[-2] = chunks[-2] + "\n" + chunks[-1]
+        chunks.pop()
+
     return chunks
 
 
+# Final pass over the merged document; field normalization already happened
+# at parse time via the model validators
+def finalize_requirements(document: RequirementsDocument) -> RequirementsDocument:
+    """Assign unique IDs on the merged document."""
+    # Assign unique IDs after collecting all requirements
+    all_reqs = chain.from_iterable(
+        group.requirements for group in document.groups.values()
+    )
+    for i, req in enumerate(all_reqs, start=1):
+        req.id = f"R{i}"
+
+    return document
+
+
+# Coroutine to process a single chunk, bounded by the shared semaphore
+async def process_chunk_async(
+    client: AsyncOpenAI,
+    chunk: str,
+    i: int,
+    total_chunks: int,
+    sem: asyncio.Semaphore,
+    limiter: AsyncLimiter,
+    cache: ExtractionCache = None,
+):
+    """Process a single chunk, bounded by the shared semaphore."""
+    # Extraction is deterministic at temperature=0, so a cache hit can skip
+    # the LLM call entirely
+    if cache is not None:
+        key = ExtractionCache.make_key(MODEL, PROMPT_VERSION, chunk)
+        if (cached := cache.get(key)) is not None:
+            return RequirementsDocument.model_validate_json(cached)
+
+    # Structured outputs guarantee schema-valid JSON, so the only retry
+    # needed is for transport errors
+    retries = 2
+    async with sem:
+        for attempt in range(retries):
+            try:
+                # Extract requirements from the current chunk, paced by the
+                # shared requests-per-minute budget
+                async with limiter:
+                    new_requirements = await extract_requirements_from_chunk_async(
+                        client, chunk, i, total_chunks
+                    )
+            except OpenAIError as e:
+                if attempt < retries - 1:
+                    continue  # Retry
+                logging.error(f"Error extracting chunk {i}: {e}")
+                return None
+            if cache is not None:
+                cache.set(key, new_requirements.model_dump_json())
+            return new_requirements
+
+
+# Progress file for long runs: one JSONL line per completed chunk, so an
+# interrupted run resumes in O(remaining chunks) instead of restarting
+PARTIAL_PATH = "requirements-multithread.partial.jsonl"
+
+
+def _load_partial(path: str) -> Dict[str, str]:
+    """Load completed chunk results left by an interrupted run."""
+    results = {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    results[entry["key"]] = entry["document"]
+    except FileNotFoundError:
+        pass
+    except (OSError, json.JSONDecodeError, KeyError) as e:
+        logging.warning(f"Ignoring unreadable partial file {path}: {e}")
+    return results
+
+
+def _append_partial(path: str, key: str, json_output: str) -> None:
+    """Append one completed chunk to the partial file; errors are non-fatal."""
+    try:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"key": key, "document": json_output}) + "\n")
+    except OSError as e:
+        logging.warning(f"Failed to append to partial file {path}: {e}")
+
+
+# Async driver: fan out all chunk calls concurrently and merge the results
+async def process_requirements_async(
+    style_guide_text: str,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    use_cache: bool = True,
+    rpm: int = DEFAULT_RPM,
+) -> RequirementsDocument:
+    """Process the style guide text and extract requirements concurrently."""
+    chunks = split_content(style_guide_text)
+    total_chunks = len(chunks)
+
+    client = _make_async_client()
+    cache = ExtractionCache() if use_cache else None
+    sem = asyncio.Semaphore(concurrency)
+    limiter = AsyncLimiter(rpm, 60)
+    all_requirements = RequirementsDocument()
+    partial = _load_partial(PARTIAL_PATH)
+
+    # Each task merges its own result under per-group locks, so merging
+    # overlaps with still-in-flight calls instead of queueing behind a
+    # single consumer loop. Completed chunks are streamed to the partial
+    # file as they land.
+    async def run_chunk(chunk: str, i: int) -> bool:
+        key = ExtractionCache.make_key(MODEL, PROMPT_VERSION, chunk)
+        if (resumed := partial.get(key)) is not None:
+            new_requirements = RequirementsDocument.model_validate_json(resumed)
+        else:
+            new_requirements = await process_chunk_async(
+                client, chunk, i, total_chunks, sem, limiter, cache
+            )
+            if new_requirements:
+                _append_partial(PARTIAL_PATH, key, new_requirements.model_dump_json())
+        if new_requirements:
+            await all_requirements.update_async(new_requirements)
+        return new_requirements is not None
+
+    tasks = [
+        asyncio.create_task(run_chunk(chunk, i + 1)) for i, chunk in enumerate(chunks)
+    ]
+    try:
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        await client.close()
+    complete = True
+    for i, result in enumerate(results, start=1):
+        if isinstance(result, Exception):
+            logging.error(f"Error processing chunk {i}: {result}")
+            complete = False
+        elif result is False:
+            complete = False
+
+    # Keep the partial file when any chunk failed so the next run can
+    # resume; otherwise it has served its purpose
+    if complete:
+        try:
+            os.remove(PARTIAL_PATH)
+        except FileNotFoundError:
+            pass
+
+    return finalize_requirements(all_requirements)
+
+
 # Main function to process the style guide and extract requirements
-def process_requirements(style_guide_text: str) -> RequirementsDocument:
+def process_requirements(
+    style_guide_text: str,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    use_cache: bool = True,
+    rpm: int = DEFAULT_RPM,
+) -> RequirementsDocument:
     """Process the style guide text and extract requirements."""
-    ell.init(store="./logdir", autocommit=True, verbose=True)
+    _init_ell()
+    return asyncio.run(
+        process_requirements_async(style_guide_text, concurrency, use_cache, rpm)
+    )
+
+
+# Validating extracted JSON is CPU-bound pydantic-core work (stripping and
+# classification fixes happen in the validators), so bulk result sets are
+# parsed across processes. Below this many documents the fork and pickle
+# overhead outweighs the win.
+_PROCESS_VALIDATION_THRESHOLD = 200
+
+
+def _validate_document_json(raw: str):
+    """Validate one document's JSON; top-level so it pickles for worker processes."""
+    try:
+        return RequirementsDocument.model_validate_json(raw)
+    except ValidationError:
+        return None
+
+
+def _validate_documents(raw_documents: List[str]):
+    """Validate many documents, across processes when the list is large."""
+    if len(raw_documents) > _PROCESS_VALIDATION_THRESHOLD:
+        with concurrent.futures.ProcessPoolExecutor() as pool:
+            return list(
+                pool.map(_validate_document_json, raw_documents, chunksize=16)
+            )
+    return [_validate_document_json(raw) for raw in raw_documents]
+
+
+# Batch API path for offline runs: 50% token cost and no rate-limit
+# pressure, at the price of waiting for the batch to complete
+def _build_batch_line(chunk: str, i: int, total_chunks: int) -> str:
+    """Build one Batch API JSONL line for a chunk extraction request."""
+    return json.dumps(
+        {
+            "custom_id": f"chunk-{i}",
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": MODEL,
+                "temperature": 0.0,
+                "response_format": {"type": "json_object"},
+                "messages": [
+                    {"role": "system", "content": STATIC_SYSTEM_PROMPT},
+                    {"role": "user", "content": f"Chunk ({i}/{total_chunks}):\n{chunk}"},
+                ],
+            },
+        }
+    )
+
+
+def process_requirements_batch(
+    style_guide_text: str, use_cache: bool = True, poll_interval: float = 30.0
+) -> RequirementsDocument:
+    """Process the style guide text via the OpenAI Batch API.
+
+    Suited to the non-interactive __main__ path: all uncached chunks are
+    submitted as one batch, polled until completion, and merged.
+    """
+    chunks = split_content(style_guide_text)
+    total_chunks = len(chunks)
+    cache = ExtractionCache() if use_cache else None
+
+    all_requirements = RequirementsDocument()
+    pending = []  # (chunk index, cache key) for chunks that need the LLM
+    for i, chunk in enumerate(chunks, start=1):
+        key = None
+        if cache is not None:
+            key = ExtractionCache.make_key(MODEL, PROMPT_VERSION, chunk)
+            if (cached := cache.get(key)) is not None:
+                all_requirements.update(
+                    RequirementsDocument.model_validate_json(cached)
+                )
+                continue
+        pending.append((i, key))
+
+    if pending:
+        client = OpenAI()
+        jsonl = "\n".join(
+            _build_batch_line(chunks[i - 1], i, total_chunks) for i, _ in pending
+        )
+        batch_file = client.files.create(
+            file=("chunks.jsonl", jsonl.encode()), purpose="batch"
+        )
+        batch = client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+        )
+        logging.info(f"Submitted batch {batch.id} with {len(pending)} chunks")
+
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            time.sleep(poll_interval)
+            batch = client.batches.retrieve(batch.id)
+        if batch.status != "completed":
+            raise RuntimeError(f"Batch {batch.id} finished with status {batch.status}")
+
+        keys = {f"chunk-{i}": key for i, key in pending}
+        output = client.files.content(batch.output_file_id).text
+
+        # Collect successful outputs first, then validate them in bulk so
+        # large result sets can be parsed across processes
+        raw_results = []  # (custom_id, json_output)
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+            result = json.loads(line)
+            response = result.get("response") or {}
+            if response.get("status_code") != 200:
+                logging.error(
+                    f"Batch request {result.get('custom_id')} failed: {result.get('error')}"
+                )
+                continue
+            json_output = strip_code_fences(
+                response["body"]["choices"][0]["message"]["content"]
+            )
+            raw_results.append((result["custom_id"], json_output))
+
+        documents = _validate_documents([raw for _, raw in raw_results])
+        for (custom_id, json_output), new_requirements in zip(raw_results, documents):
+            if new_requirements is None:
+                logging.error(f"Error parsing JSON in batch result {custom_id}")
+                continue
+            if cache is not None:
+                cache.set(keys[custom_id], json_output)
+            all_requirements.update(new_requirements)
+
+    return finalize_requirements(all_requirements)
+
+
+# Legacy thread-based path, kept as a fallback for callers that cannot run
+# an event loop of their own
+def process_requirements_threaded(
+    style_guide_text: str, use_cache: bool = True
+) -> RequirementsDocument:
+    """Process the style guide text and extract requirements using a thread pool."""
+    _init_ell()
     chunks = split_content(style_guide_text)
     total_chunks = len(chunks)
+    cache = ExtractionCache() if use_cache else None
 
     # Function to process a single chunk
     def process_chunk(chunk_data):
         chunk, i = chunk_data
+        if cache is not None:
+            key = ExtractionCache.make_key(MODEL, PROMPT_VERSION, chunk)
+            if (cached := cache.get(key)) is not None:
+                return RequirementsDocument.model_validate_json(cached)
+
+        messages = [ell.user(f"Chunk ({i}/{total_chunks}):\n{chunk}")]
         retries = 3
         for attempt in range(retries):
             try:
                 # Extract requirements from the current chunk
-                raw_output = extract_requirements_from_chunk(chunk, i, total_chunks)
+                response = extract_requirements_from_chunk(messages)
                 # Clean the output
-                json_output = raw_output.strip().strip("```json").strip("```").strip()
+                json_output = strip_code_fences(response.text)
                 # Validate that the output is proper JSON
                 new_requirements = RequirementsDocument.model_validate_json(json_output)
+                if cache is not None:
+                    cache.set(key, json_output)
                 return new_requirements
             except (json.JSONDecodeError, ValidationError) as e:
                 if attempt < retries - 1:
-                    continue  # Retry
+                    # At temperature=0 an identical retry returns the same
+                    # output, so feed the validation error back instead
+                    messages.append(response)
+                    messages.append(
+                        ell.user(
+                            f"Your previous output failed schema validation with: {e}. "
+                            "Return corrected JSON only."
+                        )
+                    )
+                    time.sleep(1.0 * (attempt + 1))
+                    continue  # Retry with feedback
                 else:
                     logging.error(f"Error parsing JSON in chunk {i}: {e}")
                     logging.error(f"Raw output:\n{json_output}\n")
@@ -149,32 +718,37 @@ def process_requirements(style_guide_text: str) -> RequirementsDocument:
             if new_requirements:
                 all_requirements.update(new_requirements)
 
-    # Assign unique IDs after collecting all requirements
-    id_counter = 1
-    for group in all_requirements.groups.values():
-        for req in group.requirements:
-            req.id = f"R{id_counter}"
-            id_counter += 1
-            # Ensure classification terms are within allowed values
-            if req.classification not in ALLOWED_CLASSIFICATIONS:
-                req.classification = "Flexible Guideline"
-
-    # Post-processing: normalize and clean data fields
-    for group in all_requirements.groups.values():
-        group.description = group.description.strip()
-        for req in group.requirements:
-            req.description = req.description.strip()
-            req.reference = req.reference.strip()
-            req.category = req.category.strip()
-            req.where = req.where.strip()
-            req.when = req.when.strip()
-            req.classification = req.classification.strip()
-            # Standardize text cases if needed
-
-    return all_requirements
+    return finalize_requirements(all_requirements)
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Extract requirements from a style guide"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help="Maximum number of concurrent LLM calls",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Skip the on-disk extraction cache and always call the LLM",
+    )
+    parser.add_argument(
+        "--rpm",
+        type=int,
+        default=DEFAULT_RPM,
+        help="Requests-per-minute budget for pacing LLM calls",
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Submit chunks via the OpenAI Batch API (cheaper, but waits for the batch to complete)",
+    )
+    args = parser.parse_args()
+
     # Replace with your actual style guide content
     style_guide_content = """
 [
@@ -287,7 +861,18 @@ if __name__ == "__main__":
     """
 
     # Process the style guide to extract requirements
-    requirements_document = process_requirements(style_guide_content)
-    # Output the final JSON
-    with open("requirements-multithread.json", "w") as f:
-        json.dump(requirements_document.model_dump(), f, indent=4)
+    if args.batch:
+        requirements_document = process_requirements_batch(
+            style_guide_content, use_cache=not args.no_cache
+        )
+    else:
+        requirements_document = process_requirements(
+            style_guide_content,
+            concurrency=args.concurrency,
+            use_cache=not args.no_cache,
+            rpm=args.rpm,
+        )
+    # Output the final JSON straight from pydantic-core's serializer,
+    # skipping the intermediate model_dump dict
+    with open("requirements-multithread.json", "w", encoding="utf-8") as f:
+        f.write(requirements_document.model_dump_json(indent=4))
@@ -0,0 +1,47 @@
+# Content-addressable on-disk cache for deterministic LLM extraction calls
+import hashlib
+import logging
+from pathlib import Path
+from typing import Optional
+
+
+class ExtractionCache:
+    """Stores validated JSON outputs under ./llm_cache/{sha256}.json.
+
+    Extraction runs at temperature=0, so the output for a given
+    (model, prompt version, chunk) triple is deterministic and can be
+    reused across runs without re-hitting the LLM.
+    """
+
+    def __init__(self, cache_dir: str = "./llm_cache"):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def make_key(model: str, prompt_version: str, chunk: str) -> str:
+        """Build the cache key for a chunk extraction call."""
+        return hashlib.sha256(
+            f"{model}|{prompt_version}|".encode() + chunk.encode()
+        ).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached JSON for key, or None on a miss."""
+        path = self._path(key)
+        try:
+            return path.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logging.warning(f"Failed to read cache entry {path}: {e}")
+            return None
+
+    def set(self, key: str, value: str) -> None:
+        """Store validated JSON for key; cache errors are non-fatal."""
+        path = self._path(key)
+        try:
+            path.write_text(value, encoding="utf-8")
+        except OSError as e:
+            logging.warning(f"Failed to write cache entry {path}: {e}")